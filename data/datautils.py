@@ -1,38 +1,94 @@
 import sys
+from dataclasses import dataclass
 from pathlib import Path
 import logging
-import json
+import mmap
 from typing import Dict, List, Any
 import re
-import difflib
+
+import numpy as np
+import orjson
+from rapidfuzz.distance import Levenshtein
+
+try:
+    import polars as pl
+except ImportError:  # pragma: no cover - optional fast path
+    pl = None
 
 logging.basicConfig(level=logging.INFO)
 
+
+@dataclass
+class NormalizedWords:
+    """Normalized transcript words in struct-of-arrays form.
+
+    Keeping the texts in one list and the timings in contiguous float arrays
+    (instead of one ~240B dict per word) cuts memory and lets the timing
+    metrics index the arrays directly instead of rebuilding them per call.
+    """
+    texts: List[str]
+    starts: np.ndarray
+    ends: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
 def load_metadata_jsonl(metadata_path: Path) -> Dict[str, Dict]:
     """Load metadata from JSONL file and index by filename."""
     metadata = {}
-    with open(metadata_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            if line.strip():
-                entry = json.loads(line)
-                # Extract filename from file_name field
-                file_name = Path(entry.get('file_name', '')).stem
-                metadata[file_name] = entry
+    if Path(metadata_path).stat().st_size == 0:
+        return metadata
+
+    # Preferred path: polars parses the whole NDJSON file with multithreaded
+    # native code, far faster than per-line parsing for large metadata files.
+    if pl is not None:
+        df = pl.read_ndjson(metadata_path)
+        for row in df.iter_rows(named=True):
+            file_name = Path(row.get('file_name', '') or '').stem
+            metadata[file_name] = row
+        return metadata
+
+    # Fallback: mmap the file and hand byte slices straight to orjson: no
+    # text-mode utf-8 decode and no per-line buffer copies.
+    with open(metadata_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b''):
+                if line.strip():
+                    entry = orjson.loads(line)
+                    # Extract filename from file_name field
+                    file_name = Path(entry.get('file_name', '')).stem
+                    metadata[file_name] = entry
     return metadata
 
+# Compiled once at import; normalize_word runs once per transcript word,
+# so recompiling the pattern inside re.sub on every call adds up.
+_NONWORD_RE = re.compile(r'[^\w]')
+
 def normalize_word(word: str) -> str:
     """Normalize word: lowercase and remove punctuation."""
-    # Convert to lowercase
-    word = word.lower()
-    # Remove punctuation
-    word = re.sub(r'[^\w]', '', word)
-    return word
+    return _NONWORD_RE.sub('', word.lower())
+
+def align_words(whisper_words: NormalizedWords, actual_words: NormalizedWords):
+    """Compute the Levenshtein alignment between two normalized transcripts.
 
-def calculate_word_error_rate(whisper_words: List[Dict], actual_words: List[Dict]) -> Dict[str, Any]:
+    Returns the opcodes once so both `calculate_word_error_rate` and
+    `calculate_timing_rmse` can share a single alignment pass instead of
+    each realigning the same word lists.
+    """
+    return Levenshtein.opcodes(actual_words.texts, whisper_words.texts)
+
+
+def calculate_word_error_rate(
+    whisper_words: NormalizedWords,
+    actual_words: NormalizedWords,
+    opcodes=None
+) -> Dict[str, Any]:
     """Calculate Word Error Rate between Whisper and actual transcriptions.
-    
-    Words are normalized (lowercase, punctuation removed) for comparison.
-    
+
+    Expects inputs already normalized via `normalize_transcript_words`.
+    `opcodes` may be a precomputed alignment from `align_words`; if omitted,
+    the alignment is computed here.
+
     Returns:
         Dict with WER metrics:
         - wer: Word error rate (0-1)
@@ -42,27 +98,16 @@ def calculate_word_error_rate(whisper_words: List[Dict], actual_words: List[Dict
         - correct_matches: Count of correctly matched words
         - total_actual_words: Total words in actual transcription
     """
-    # Assumes input lists are already normalized: actual_words[].text and whisper_words[].word
-    actual_normalized = [w.get('text', '') for w in actual_words]
-    whisper_normalized = [w.get('word', '') for w in whisper_words]
-
-    # Use difflib to align sequences
-    matcher = difflib.SequenceMatcher(None, actual_normalized, whisper_normalized)
-    matching_blocks = matcher.get_matching_blocks()
+    total_actual = len(actual_words)
+    total_whisper = len(whisper_words)
 
-    # Count matches
-    correct_matches = sum(block.size for block in matching_blocks)
+    if opcodes is None:
+        opcodes = align_words(whisper_words, actual_words)
 
-    total_actual = len(actual_normalized)
-    total_whisper = len(whisper_normalized)
-
-    # Substitutions are minimum of unmatched words in both
-    unmatched_actual = total_actual - correct_matches
-    unmatched_whisper = total_whisper - correct_matches
-
-    substitutions = min(unmatched_actual, unmatched_whisper)
-    deletions = max(0, unmatched_actual - substitutions)  # Words in actual but not in whisper
-    insertions = max(0, unmatched_whisper - substitutions)  # Words in whisper but not in actual
+    substitutions = sum(op.src_end - op.src_start for op in opcodes if op.tag == 'replace')
+    deletions = sum(op.src_end - op.src_start for op in opcodes if op.tag == 'delete')  # Words in actual but not in whisper
+    insertions = sum(op.dest_end - op.dest_start for op in opcodes if op.tag == 'insert')  # Words in whisper but not in actual
+    correct_matches = total_actual - substitutions - deletions
 
     # Calculate WER
     wer = (substitutions + deletions + insertions) / total_actual if total_actual > 0 else 0.0
@@ -76,10 +121,17 @@ def calculate_word_error_rate(whisper_words: List[Dict], actual_words: List[Dict
         'total_actual_words': total_actual,
     }
 
-def calculate_timing_rmse(whisper_words: List[Dict], actual_words: List[Dict]) -> Dict[str, Any]:
+def calculate_timing_rmse(
+    whisper_words: NormalizedWords,
+    actual_words: NormalizedWords,
+    opcodes=None
+) -> Dict[str, Any]:
     """Calculate Root Mean Squared Error (RMSE) between word timing for correctly matched words.
 
     Only considers words that are transcribed correctly (after normalization).
+    Expects inputs already normalized via `normalize_transcript_words`.
+    `opcodes` may be a precomputed alignment from `align_words`; if omitted,
+    the alignment is computed here.
 
     Returns:
         Dict with timing metrics:
@@ -98,51 +150,50 @@ def calculate_timing_rmse(whisper_words: List[Dict], actual_words: List[Dict]) -
             'avg_end_diff': 0,
         }
     
-    # Assumes `actual_words` and `whisper_words` already contain normalized text
-    actual_normalized = [w.get('text', '') for w in actual_words]
-    whisper_normalized = [w.get('word', '') for w in whisper_words]
+    # Timing columns are already contiguous float arrays in the SoA layout
+    actual_starts = actual_words.starts
+    actual_ends = actual_words.ends
+    whisper_starts = whisper_words.starts
+    whisper_ends = whisper_words.ends
+
+    # Aligned matches are the 'equal' blocks of the Levenshtein opcodes
+    if opcodes is None:
+        opcodes = align_words(whisper_words, actual_words)
+
+    actual_idx_parts = []
+    whisper_idx_parts = []
+    for op in opcodes:
+        if op.tag == 'equal':
+            size = op.src_end - op.src_start
+            actual_idx_parts.append(np.arange(op.src_start, op.src_end))
+            whisper_idx_parts.append(np.arange(op.dest_start, op.dest_start + size))
+
+    if not actual_idx_parts:
+        return {
+            'start_rmse': 0,
+            'end_rmse': 0,
+            'matched_words_with_timing': 0,
+            'avg_start_diff': 0,
+            'avg_end_diff': 0,
+        }
 
-    # Find aligned matches
-    matcher = difflib.SequenceMatcher(None, actual_normalized, whisper_normalized)
-    matching_blocks = matcher.get_matching_blocks()
-    
-    start_diffs_sq = []
-    end_diffs_sq = []
-    start_diffs_abs = []
-    end_diffs_abs = []
-    matched_count = 0
-    
-    for block in matching_blocks:
-        # block = (actual_idx, whisper_idx, size)
-        for i in range(block.size):
-            actual_idx = block.a + i
-            whisper_idx = block.b + i
-            
-            actual_word = actual_words[actual_idx]
-            whisper_word = whisper_words[whisper_idx]
-            
-            # Calculate timing differences
-            start_diff = actual_word.get('start', 0) - whisper_word.get('start', 0)
-            end_diff = actual_word.get('end', 0) - whisper_word.get('end', 0)
-            
-            start_diffs_sq.append(start_diff ** 2)
-            end_diffs_sq.append(end_diff ** 2)
-            start_diffs_abs.append(abs(start_diff))
-            end_diffs_abs.append(abs(end_diff))
-            matched_count += 1
-    
-    # Calculate MSE
-    # Mean squared errors
-    start_mse = sum(start_diffs_sq) / len(start_diffs_sq) if start_diffs_sq else 0
-    end_mse = sum(end_diffs_sq) / len(end_diffs_sq) if end_diffs_sq else 0
-    avg_start_diff = sum(start_diffs_abs) / len(start_diffs_abs) if start_diffs_abs else 0
-    avg_end_diff = sum(end_diffs_abs) / len(end_diffs_abs) if end_diffs_abs else 0
+    actual_idx = np.concatenate(actual_idx_parts)
+    whisper_idx = np.concatenate(whisper_idx_parts)
+    matched_count = int(actual_idx.size)
+
+    # Timing differences for all matched words at once
+    start_diff = actual_starts[actual_idx] - whisper_starts[whisper_idx]
+    end_diff = actual_ends[actual_idx] - whisper_ends[whisper_idx]
+
+    start_mse = float(np.mean(start_diff * start_diff))
+    end_mse = float(np.mean(end_diff * end_diff))
+    avg_start_diff = float(np.mean(np.abs(start_diff)))
+    avg_end_diff = float(np.mean(np.abs(end_diff)))
 
     # Root mean squared errors (RMSE)
-    from math import sqrt
-    start_rmse = sqrt(start_mse) if start_mse else 0
-    end_rmse = sqrt(end_mse) if end_mse else 0
-    
+    start_rmse = float(np.sqrt(start_mse))
+    end_rmse = float(np.sqrt(end_mse))
+
     return {
         'start_rmse': start_rmse,
         'end_rmse': end_rmse,
@@ -152,23 +203,18 @@ def calculate_timing_rmse(whisper_words: List[Dict], actual_words: List[Dict]) -
     }
 
 
-def normalize_transcript_words(words: List[Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+def normalize_transcript_words(words: List[Dict[str, Any]], key: str) -> NormalizedWords:
     """Normalize transcript words by lowercasing and removing punctuation.
-    
+
     Args:
         words: List of word dicts with timing info
         key: Key in dict to normalize ("word" for whisper, "text" for actual)
-        
+
     Returns:
-        List of normalized word dicts with timing info
+        NormalizedWords with the normalized texts and timing arrays
     """
-    normalized = []
-    for w in words:
-        token = w.get(key, '')
-        norm = normalize_word(token)
-        normalized.append({
-            key: norm,
-            'start': w.get('start', 0),
-            'end': w.get('end', 0)
-        })
-    return normalized
\ No newline at end of file
+    count = len(words)
+    texts = [normalize_word(w.get(key, '')) for w in words]
+    starts = np.fromiter((w.get('start', 0) for w in words), dtype=np.float64, count=count)
+    ends = np.fromiter((w.get('end', 0) for w in words), dtype=np.float64, count=count)
+    return NormalizedWords(texts=texts, starts=starts, ends=ends)
\ No newline at end of file
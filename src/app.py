@@ -1,7 +1,10 @@
 """Streamlit web app for automatic music censoring."""
 
 import streamlit as st
+import hashlib
+import os
 import sys
+import torchaudio
 from pathlib import Path
 import logging
 import json
@@ -9,19 +12,92 @@ import shutil
 import tempfile
 import zipfile
 import io
+import queue
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+
 logging.basicConfig(level=logging.INFO)
 # Add project root to path
 project_root = Path(__file__).resolve().parents[1] 
 sys.path.insert(0, str(project_root))
 
-from models.demucs_processor import isolate_vocals
-from models.whisper_processor import transcribe_vocals
+from models.demucs_processor import isolate_vocals, load_separator
+from models.whisper_processor import transcribe_vocals, load_whisper_model
 from models.chatgpt_censor import censor_with_chatgpt
 from models.ffmpeg_processor import process_censored_audio
 
 
+@st.cache_resource
+def get_separator(model_name: str):
+    """Load and cache the Demucs separator so reruns don't reload weights."""
+    return load_separator(model=model_name)
+
+
+@st.cache_resource
+def get_whisper_model(model_size: str, compute_type: str = "auto"):
+    """Load and cache the faster-whisper model so reruns don't reload weights."""
+    return load_whisper_model(
+        model_size,
+        compute_type=None if compute_type == "auto" else compute_type
+    )
+
+
+class StatusReporter:
+    """Applies status/progress widget updates from a background thread.
+
+    Each widget update round-trips to the browser; queueing them keeps that
+    latency out of the processing path between blocking model calls.
+    """
+
+    _SENTINEL = object()
+
+    def __init__(self, status_text, progress_bar):
+        self._status_text = status_text
+        self._progress_bar = progress_bar
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        add_script_run_ctx(self._thread)
+        self._thread.start()
+
+    def update(self, message=None, progress=None):
+        """Queue a status message and/or progress fraction; returns immediately."""
+        self._queue.put((message, progress))
+
+    def close(self):
+        """Flush pending updates and stop the updater thread."""
+        self._queue.put(self._SENTINEL)
+        self._thread.join(timeout=5)
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            if item is self._SENTINEL:
+                break
+            message, progress = item
+            try:
+                if message is not None:
+                    self._status_text.text(message)
+                if progress is not None:
+                    self._progress_bar.progress(progress)
+            except Exception:
+                # Widget may be gone after a rerun; drop the update
+                pass
+
+
+@st.cache_data
+def read_file_bytes(path: str, mtime: float) -> bytes:
+    """Read an output file once per (path, mtime).
+
+    Streamlit reruns the whole script on every widget interaction; caching on
+    path + mtime keeps multi-MB WAVs from being re-read from disk each rerun.
+    """
+    return Path(path).read_bytes()
+
+
 def initialize_output_tracking():
     """Initialize the output tracking dictionary in session state."""
     if "output_files" not in st.session_state:
@@ -38,6 +114,13 @@ def initialize_output_tracking():
         temp_output_dir = tempfile.mkdtemp(prefix="autocensor_outputs_")
         st.session_state.output_dir = Path(temp_output_dir)
         st.session_state.output_dir.mkdir(parents=True, exist_ok=True)
+    if "stage_cache_dir" not in st.session_state:
+        # Intermediate artifacts keyed by upload hash; survives
+        # clear_output_tracking so retries after a mid-pipeline failure
+        # (e.g. a ChatGPT API error) don't re-run Demucs/Whisper
+        st.session_state.stage_cache_dir = Path(
+            tempfile.mkdtemp(prefix="autocensor_stage_cache_")
+        )
 
 
 def clear_output_tracking():
@@ -124,9 +207,8 @@ def display_download_table(output_files: Dict[str, List[str]]):
                     mime_type, download_name, path = get_file_metadata(file_path, output_type, file_idx)
                     
                     if path and Path(path).exists():
-                        with open(path, "rb") as f:
-                            file_data = f.read()
-                        
+                        file_data = read_file_bytes(path, os.path.getmtime(path))
+
                         st.download_button(
                             label="⬇️ Download",
                             data=file_data,
@@ -135,6 +217,11 @@ def display_download_table(output_files: Dict[str, List[str]]):
                             key=f"dl_{output_type}_{file_idx}",
                             use_container_width=True
                         )
+
+                        if output_type == "Censored Audio":
+                            # Reuse the same bytes for the inline player so
+                            # the WAV isn't read from disk a second time
+                            st.audio(file_data, format=mime_type)
                     else:
                         st.write("—")  # No file available (e.g., no censored words)
                 else:
@@ -143,10 +230,10 @@ def display_download_table(output_files: Dict[str, List[str]]):
     # Add download all as zip button
     st.markdown("---")
     st.markdown("### Download All Outputs")
-    zip_buffer = create_zip_from_outputs(output_files)
+    zip_path = create_zip_from_outputs(output_files)
     st.download_button(
         label="📦 Download All Outputs as ZIP",
-        data=zip_buffer,
+        data=read_file_bytes(str(zip_path), os.path.getmtime(zip_path)),
         file_name="all_outputs.zip",
         mime="application/zip",
         use_container_width=True,
@@ -154,42 +241,61 @@ def display_download_table(output_files: Dict[str, List[str]]):
     )
 
 
-def create_zip_from_outputs(output_files: Dict[str, List[str]]) -> io.BytesIO:
-    """Create a zip file containing all output files."""
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        # Get the number of files processed
-        num_files = len(output_files["Original Audio"])
-        
-        for file_idx in range(num_files):
-            file_base_name = Path(output_files["Original Audio"][file_idx]).stem if output_files["Original Audio"][file_idx] else f"file_{file_idx}"
-            
-            # Add each output file if it exists
-            for output_type, paths in output_files.items():
-                if file_idx < len(paths) and paths[file_idx]:
-                    file_path = Path(paths[file_idx])
-                    if file_path.exists():
-                        # Create a clean filename
-                        if output_type == "Original Audio":
-                            zip_name = f"{file_idx+1}_{file_base_name}_original{file_path.suffix}"
-                        elif output_type == "Vocals":
-                            zip_name = f"{file_idx+1}_{file_base_name}_vocals{file_path.suffix}"
-                        elif output_type == "Instrumental":
-                            zip_name = f"{file_idx+1}_{file_base_name}_instrumental{file_path.suffix}"
-                        elif output_type == "Transcription":
-                            zip_name = f"{file_idx+1}_{file_base_name}_transcription.txt"
-                        elif output_type == "Censored Words":
-                            zip_name = f"{file_idx+1}_{file_base_name}_censored_words.json"
-                        elif output_type == "Censored Audio":
-                            zip_name = f"{file_idx+1}_{file_base_name}_censored{file_path.suffix}"
-                        else:
-                            zip_name = f"{file_idx+1}_{file_base_name}_{output_type.lower().replace(' ', '_')}{file_path.suffix}"
-                        
-                        zip_file.write(file_path, zip_name)
-    
-    zip_buffer.seek(0)
-    return zip_buffer
+def create_zip_from_outputs(output_files: Dict[str, List[str]]) -> Path:
+    """Write a zip of all output files to the session output directory.
+
+    The archive is written to disk (so members stream from their files
+    instead of being buffered through an in-RAM BytesIO) and only rebuilt
+    when a member is newer than the existing zip, so plain widget reruns
+    don't re-archive the whole batch.
+    """
+    zip_path = st.session_state.output_dir / "all_outputs.zip"
+
+    # Collect (path, name-in-zip) pairs for every existing output file
+    members = []
+    num_files = len(output_files["Original Audio"])
+    for file_idx in range(num_files):
+        file_base_name = Path(output_files["Original Audio"][file_idx]).stem if output_files["Original Audio"][file_idx] else f"file_{file_idx}"
+
+        for output_type, paths in output_files.items():
+            if file_idx < len(paths) and paths[file_idx]:
+                file_path = Path(paths[file_idx])
+                if file_path.exists():
+                    # Create a clean filename
+                    if output_type == "Original Audio":
+                        zip_name = f"{file_idx+1}_{file_base_name}_original{file_path.suffix}"
+                    elif output_type == "Vocals":
+                        zip_name = f"{file_idx+1}_{file_base_name}_vocals{file_path.suffix}"
+                    elif output_type == "Instrumental":
+                        zip_name = f"{file_idx+1}_{file_base_name}_instrumental{file_path.suffix}"
+                    elif output_type == "Transcription":
+                        zip_name = f"{file_idx+1}_{file_base_name}_transcription.txt"
+                    elif output_type == "Censored Words":
+                        zip_name = f"{file_idx+1}_{file_base_name}_censored_words.json"
+                    elif output_type == "Censored Audio":
+                        zip_name = f"{file_idx+1}_{file_base_name}_censored{file_path.suffix}"
+                    else:
+                        zip_name = f"{file_idx+1}_{file_base_name}_{output_type.lower().replace(' ', '_')}{file_path.suffix}"
+
+                    members.append((file_path, zip_name))
+
+    # Reuse the existing archive unless an output changed since it was built
+    if zip_path.exists():
+        zip_mtime = zip_path.stat().st_mtime
+        if all(path.stat().st_mtime <= zip_mtime for path, _ in members):
+            return zip_path
+
+    # ZIP_STORED: the payload is mostly WAV/MP3, which deflate can't shrink
+    # meaningfully, so compression would just burn CPU on the rebuild
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zip_file:
+        for file_path, zip_name in members:
+            # Copy in 1 MiB chunks rather than ZipFile.write's 8 KB reads,
+            # which loop in Python ~128x more often on big WAVs
+            with open(file_path, "rb") as src, \
+                    zip_file.open(zip_name, "w", force_zip64=True) as dst:
+                shutil.copyfileobj(src, dst, length=1 << 20)
+
+    return zip_path
 
 def main():
 
@@ -225,6 +331,14 @@ def main():
             ["turbo", "large"],
             index=0
         )
+
+        whisper_compute_type = st.selectbox(
+            "Whisper Compute Type",
+            ["auto", "float16", "int8_float16", "int8", "float32"],
+            index=0,
+            help="CTranslate2 quantization for faster-whisper. "
+                "int8 variants are faster and use less memory."
+        )
         
         chatgpt_model = st.selectbox(
             "ChatGPT Model",
@@ -283,6 +397,32 @@ def main():
                 file_processing = st.empty()
                 status_text = st.empty()
 
+                # Start loading the Whisper model in the background so its
+                # weights are warm by the time Demucs finishes Step 1; the
+                # loader is cached, so this is free after the first run.
+                model_load_executor = ThreadPoolExecutor(max_workers=1)
+                whisper_model_future = model_load_executor.submit(
+                    get_whisper_model, whisper_model, whisper_compute_type
+                )
+
+                # Runs the post-Demucs stem copies while Whisper transcribes
+                stage_copy_executor = ThreadPoolExecutor(max_workers=1)
+
+                # Resolve the (cached) Demucs separator once for the whole
+                # batch instead of once per file inside the loop
+                separator = get_separator(demucs_model)
+
+                # Final ffmpeg mixes run concurrently across files; one
+                # ffmpeg doesn't saturate the CPU, and the GPU-bound stages
+                # of the next file can proceed while earlier mixes finish
+                ffmpeg_executor = ThreadPoolExecutor(
+                    max_workers=min(4, max((os.cpu_count() or 4) // 4, 1))
+                )
+                censor_futures = []
+
+                # Status/progress updates are applied off the processing path
+                reporter = StatusReporter(status_text, progress_bar)
+
                 # Process each uploaded file
                 for index, uploaded_file in enumerate(uploaded_files):
                     progress_addder = index / len(uploaded_files) # tracks percentage of files processed
@@ -293,43 +433,130 @@ def main():
                     file_output_dir.mkdir(parents=True, exist_ok=True)
 
                     try:
-                        # Save uploaded file to persistent directory
+                        # Save uploaded file to persistent directory (kept for
+                        # the download table)
                         input_audio_path = file_output_dir / uploaded_file.name
                         with open(input_audio_path, "wb") as f:
                             f.write(uploaded_file.getbuffer())
-                        
+
                         # Track original audio path
                         st.session_state.output_files["Original Audio"].append(str(input_audio_path))
+
+                        upload_bytes = uploaded_file.getvalue()
+                        # Content hash keys the per-session stage cache so a
+                        # retry of the same upload resumes at the failed stage
+                        file_hash = hashlib.sha1(upload_bytes).hexdigest()
+                        stage_cache = st.session_state.stage_cache_dir / file_hash
+
+                        # Decode the upload once in memory so Demucs doesn't
+                        # re-read and re-decode the file from disk
+                        try:
+                            input_waveform, input_sample_rate = torchaudio.load(
+                                io.BytesIO(upload_bytes)
+                            )
+                        except Exception:
+                            # Codec not supported by torchaudio; fall back to
+                            # letting Demucs decode from the saved file
+                            input_waveform, input_sample_rate = None, None
+
+                        # If the in-memory decode failed and the upload isn't
+                        # already WAV, decode the codec once up front so the
+                        # later stages read plain PCM instead of each paying
+                        # their own compressed-codec decode
+                        demucs_input_path = input_audio_path
+                        if input_waveform is None and input_audio_path.suffix.lower() != ".wav":
+                            decoded_path = file_output_dir / "input_decoded.wav"
+                            try:
+                                subprocess.run(
+                                    [
+                                        "ffmpeg", "-y", "-nostats", "-loglevel", "error",
+                                        "-i", str(input_audio_path),
+                                        "-ac", "2", "-ar", "44100", "-c:a", "pcm_s16le",
+                                        str(decoded_path)
+                                    ],
+                                    check=True,
+                                    stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE
+                                )
+                                demucs_input_path = decoded_path
+                            except Exception:
+                                # ffmpeg unavailable or decode failed; Demucs
+                                # decodes from the original as before
+                                pass
                         # Step 1: Isolate vocals with Demucs
-                        status_text.text(f"🎤 Step 1/5: Isolating vocals with Demucs... ({uploaded_file.name})")
-                        progress_bar.progress((0.1 / len(uploaded_files)) + progress_addder)
-                        
-                        separated_dir = file_output_dir / "separated"
-                        vocals_path, instrumental_path, separated_stems = isolate_vocals(
-                            input_audio_path,
-                            separated_dir,
-                            model=demucs_model
+                        reporter.update(
+                            f"🎤 Step 1/5: Isolating vocals with Demucs... ({uploaded_file.name})",
+                            (0.1 / len(uploaded_files)) + progress_addder
                         )
                         
-                        # Copy vocals and instrumental to main output directory for easy access
+                        cached_vocals = stage_cache / "vocals.wav"
+                        cached_instrumental = stage_cache / "instrumental.wav"
+                        if cached_vocals.exists() and cached_instrumental.exists():
+                            # Separated on a previous (possibly failed) run
+                            vocals_path = cached_vocals
+                            instrumental_path = cached_instrumental
+                            needs_stage_cache = False
+                        else:
+                            separated_dir = file_output_dir / "separated"
+                            vocals_path, instrumental_path, separated_stems = isolate_vocals(
+                                demucs_input_path,
+                                separated_dir,
+                                separator=separator,
+                                waveform=input_waveform,
+                                sample_rate=input_sample_rate
+                            )
+                            needs_stage_cache = True
+
+                        # Copy the stems into the stage cache and the main
+                        # output directory in the background; the copies are
+                        # pure disk I/O, so they overlap with transcription
+                        # (demucs.api doesn't expose its internal segment
+                        # loop, so per-segment Demucs→Whisper pipelining
+                        # isn't available — this hides the I/O tail instead)
                         saved_vocals_path = file_output_dir / "vocals.wav"
                         saved_instrumental_path = file_output_dir / "instrumental.wav"
-                        shutil.copy2(vocals_path, saved_vocals_path)
-                        shutil.copy2(instrumental_path, saved_instrumental_path)
-                        
-                        st.session_state.output_files["Vocals"].append(str(saved_vocals_path))
-                        st.session_state.output_files["Instrumental"].append(str(saved_instrumental_path))
-                        
-                        progress_bar.progress((0.3 / len(uploaded_files)) + progress_addder)
-                        
+
+                        def copy_stems(
+                            vocals_src=vocals_path,
+                            instrumental_src=instrumental_path,
+                            cache_stems=needs_stage_cache
+                        ):
+                            if cache_stems:
+                                stage_cache.mkdir(parents=True, exist_ok=True)
+                                shutil.copy2(vocals_src, cached_vocals)
+                                shutil.copy2(instrumental_src, cached_instrumental)
+                            shutil.copy2(vocals_src, saved_vocals_path)
+                            shutil.copy2(instrumental_src, saved_instrumental_path)
+
+                        stem_copy_future = stage_copy_executor.submit(copy_stems)
+
                         # Step 2: Transcribe vocals with Whisper
-                        status_text.text(f"📝 Step 2/5: Transcribing vocals with Whisper... ({uploaded_file.name})")
-                        
-                        transcription = transcribe_vocals(
-                            vocals_path,
-                            model_size=whisper_model
+                        reporter.update(
+                            f"📝 Step 2/5: Transcribing vocals with Whisper... ({uploaded_file.name})",
+                            (0.3 / len(uploaded_files)) + progress_addder
                         )
-                        
+
+                        transcript_key = f"transcript:{file_hash}"
+                        if transcript_key in st.session_state:
+                            transcription = st.session_state[transcript_key]
+                        else:
+                            transcription = transcribe_vocals(
+                                vocals_path,
+                                model=whisper_model_future.result(),
+                                # Stream decode progress into the status line
+                                on_segment=lambda seg, name=uploaded_file.name: reporter.update(
+                                    f"📝 Step 2/5: Transcribing vocals with Whisper... "
+                                    f"({name} — {seg['end']:.0f}s decoded)"
+                                )
+                            )
+                            st.session_state[transcript_key] = transcription
+
+                        # Join the background copies before recording outputs
+                        stem_copy_future.result()
+                        st.session_state.output_files["Vocals"].append(str(saved_vocals_path))
+                        st.session_state.output_files["Instrumental"].append(str(saved_instrumental_path))
+
                         # Save transcription to file
                         transcription_path = file_output_dir / "transcription.txt"
                         with open(transcription_path, "w", encoding="utf-8") as f:
@@ -342,11 +569,12 @@ def main():
                                 f.write(f"[{word['start']:.2f}s-{word['end']:.2f}s] {word['word']}\n")
                         
                         st.session_state.output_files["Transcription"].append(str(transcription_path))
-                        progress_bar.progress((0.5 / len(uploaded_files)) + progress_addder)
-                        
+
                         # Step 3: Get few-shot examples
-                        status_text.text(f"🤖 Step 3/5: Analyzing with ChatGPT... ({uploaded_file.name})")
-                        progress_bar.progress((0.6 / len(uploaded_files)) + progress_addder)
+                        reporter.update(
+                            f"🤖 Step 3/5: Analyzing with ChatGPT... ({uploaded_file.name})",
+                            (0.6 / len(uploaded_files)) + progress_addder
+                        )
                         
                         few_shot_examples = st.session_state.get("few_shot_examples", "")
                         
@@ -366,22 +594,30 @@ def main():
                             # No censored words, add empty string
                             st.session_state.output_files["Censored Words"].append("")
                         
-                        progress_bar.progress((0.8 / len(uploaded_files)) + progress_addder)
-                        
                         # Step 5: Process audio with FFmpeg
-                        status_text.text(f"🔇 Step 4/5: Silencing vocals and recombining... ({uploaded_file.name})")
-                        
-                        output_audio_path = file_output_dir / "censored_output.wav"
-                        process_censored_audio(
-                            vocals_path,
-                            instrumental_path,
-                            censored_words,
-                            output_audio_path,
-                            padding=silence_padding
+                        reporter.update(
+                            f"🔇 Step 4/5: Silencing vocals and recombining... ({uploaded_file.name})",
+                            (0.8 / len(uploaded_files)) + progress_addder
                         )
                         
+                        output_audio_path = file_output_dir / "censored_output.wav"
+                        censor_futures.append((
+                            index,
+                            uploaded_file.name,
+                            ffmpeg_executor.submit(
+                                process_censored_audio,
+                                vocals_path,
+                                instrumental_path,
+                                censored_words,
+                                output_audio_path,
+                                padding=silence_padding,
+                                original_audio_path=input_audio_path,
+                                tmp_dir=file_output_dir
+                            )
+                        ))
+
                         st.session_state.output_files["Censored Audio"].append(str(output_audio_path))
-                        progress_bar.progress((1.0 / len(uploaded_files)) + progress_addder)
+                        reporter.update(progress=(1.0 / len(uploaded_files)) + progress_addder)
                         
                     except Exception as e:
                         st.error(f"❌ Error during processing {uploaded_file.name}: {str(e)}")
@@ -396,6 +632,19 @@ def main():
                                 st.session_state.output_files[key].append("")
                         continue
                 
+                # Join the backgrounded mixes; a failure blanks that file's
+                # table entry instead of aborting the batch
+                for file_index, file_name, censor_future in censor_futures:
+                    try:
+                        censor_future.result()
+                    except Exception as e:
+                        st.error(f"❌ Error during mixing {file_name}: {str(e)}")
+                        st.session_state.output_files["Censored Audio"][file_index] = ""
+
+                reporter.close()
+                model_load_executor.shutdown(wait=False)
+                stage_copy_executor.shutdown(wait=True)
+                ffmpeg_executor.shutdown(wait=True)
                 file_processing.text("")
                 status_text.text("")
                 st.success("✅ All files processed!")
@@ -410,33 +659,33 @@ def main():
         )
         
         default_examples = """Example 1:
-    Input transcript:
-    [0.5s-0.8s] you
-    [1.0s-1.3s] should
-    [1.5s-1.8s] go
-    [2.0s-2.3s] and
-    [2.5s-2.8s] fuck
-    [3.0s-3.3s] yourself
-
-    Output JSON:
-    {
-    "words": [
-        { "word": "fuck", "start": 2.5, "end": 2.8 }
-    ]
-    }
+Input transcript (word\tstart\tend):
+you\t0.50\t0.80
+should\t1.00\t1.30
+go\t1.50\t1.80
+and\t2.00\t2.30
+fuck\t2.50\t2.80
+yourself\t3.00\t3.30
+
+Output JSON:
+{
+"words": [
+    { "word": "fuck", "start": 2.5, "end": 2.8 }
+]
+}
+
+Example 2:
+Input transcript (word\tstart\tend):
+what\t0.20\t0.50
+the\t0.60\t0.90
+frick\t1.00\t1.40
+is\t1.50\t1.80
+this\t2.00\t2.30
 
-    Example 2:
-    Input transcript:
-    [0.2s-0.5s] what
-    [0.6s-0.9s] the
-    [1.0s-1.4s] frick
-    [1.5s-1.8s] is
-    [2.0s-2.3s] this
-
-    Output JSON:
-    {
-    "words": []
-    }"""
+Output JSON:
+{
+"words": []
+}"""
         
         few_shot_examples = st.text_area(
             "Few-shot Examples",
@@ -1,9 +1,13 @@
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+import hashlib
+import heapq
+import json
 import logging
+import shutil
 import pandas as pd
 import time
-import csv
 
 logging.basicConfig(level=logging.INFO)
 # Add project root to path
@@ -12,37 +16,49 @@ sys.path.insert(0, str(project_root))
 
 from models.demucs_processor import isolate_vocals
 from models.whisper_processor import transcribe_vocals
-from data.datautils import load_metadata_jsonl, calculate_word_error_rate, calculate_timing_rmse, normalize_transcript_words
+from data.datautils import load_metadata_jsonl, align_words, calculate_word_error_rate, calculate_timing_rmse, normalize_transcript_words
 
 
 
-def main():
-    # Load metadata
-    metadata_path = project_root / "data/jamendolyrics/metadata.jsonl"
-    metadata = load_metadata_jsonl(metadata_path)
-    
-    results = []
-    
-    for audio_file in sorted(project_root.glob("data/jamendolyrics/subsets/en/mp3/*.mp3"))[:1]:
-        file_stem = audio_file.stem
-        logging.info(f"Processing file: {file_stem}")
+def file_sha1(path: Path) -> str:
+    """Hash a file's content so cached artifacts survive renames/moves."""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
 
-        
-        # Get actual transcription from metadata
-        if file_stem not in metadata:
-            logging.warning(f"No metadata found for {file_stem}")
-            continue
-        
-        actual_data = metadata[file_stem]
-        actual_words = actual_data.get('words', [])
-        
-        if not actual_words:
-            logging.warning(f"No words found for {file_stem}")
-            continue
-        
-        try:
-            # Isolate vocals (measure time)
-            demucs_start = time.perf_counter()
+
+def process_one(audio_file: Path, metadata: dict):
+    """Evaluate a single audio file; returns a result dict or None on skip/error."""
+    file_stem = audio_file.stem
+    logging.info(f"Processing file: {file_stem}")
+
+    # Get actual transcription from metadata
+    if file_stem not in metadata:
+        logging.warning(f"No metadata found for {file_stem}")
+        return None
+
+    actual_data = metadata[file_stem]
+    actual_words = actual_data.get('words', [])
+
+    if not actual_words:
+        logging.warning(f"No words found for {file_stem}")
+        return None
+
+    try:
+        # Content-addressed cache: reruns on the same audio skip
+        # Demucs and Whisper entirely
+        cache_dir = project_root / "data/.cache" / file_sha1(audio_file)
+        cached_vocals = cache_dir / "vocals.wav"
+        cached_transcription = cache_dir / "transcription.json"
+
+        # Isolate vocals (measure time)
+        demucs_start = time.perf_counter()
+        if cached_vocals.exists():
+            vocals_path = cached_vocals
+            logging.info(f"Using cached vocals: {vocals_path}")
+        else:
             try:
                 vocals_path, instrumental_path, _ = isolate_vocals(
                     input_audio_path=audio_file,
@@ -52,12 +68,19 @@ def main():
             except Exception as demucs_error:
                 logging.error(f"Failed to isolate vocals for {file_stem}: {demucs_error}")
                 logging.info("Skipping file due to audio loading error...")
-                continue
-            demucs_end = time.perf_counter()
-            demucs_time = demucs_end - demucs_start
-            
-            # Transcribe vocals (measure time)
-            whisper_start = time.perf_counter()
+                return None
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(vocals_path, cached_vocals)
+        demucs_end = time.perf_counter()
+        demucs_time = demucs_end - demucs_start
+
+        # Transcribe vocals (measure time)
+        whisper_start = time.perf_counter()
+        if cached_transcription.exists():
+            with open(cached_transcription, 'r', encoding='utf-8') as f:
+                transcription = json.load(f)
+            logging.info(f"Using cached transcription: {cached_transcription}")
+        else:
             try:
                 transcription = transcribe_vocals(
                     audio_path=vocals_path,
@@ -66,63 +89,97 @@ def main():
                 logging.info(f"Transcription completed. Transcript text: {transcription['text'][:100]}...")
             except Exception as whisper_error:
                 logging.error(f"Failed to transcribe {file_stem}: {whisper_error}")
-                continue
-            whisper_end = time.perf_counter()
-            whisper_time = whisper_end - whisper_start
-            
-            whisper_words = transcription.get('words', [])
-            
-            if not whisper_words:
-                logging.warning(f"No words extracted from transcription for {file_stem}")
-                continue
-            
-            # Normalize both whisper and actual words ONCE here
-            # normalized whisper_words: list of dicts with keys 'word','start','end'
-            whisper_norm = normalize_transcript_words(whisper_words, key='word')
-            actual_norm = normalize_transcript_words(actual_words, key='text')
-
-            # Save normalized transcripts to CSV for inspection / reuse
-            norm_dir = project_root / "data/eval/normalized_transcripts"
-            norm_dir.mkdir(parents=True, exist_ok=True)
-            csv_path = norm_dir / f"{file_stem}.csv"
-            try:
-                # Write rows aligning by index; if lengths differ, fill blanks
-                max_len = max(len(whisper_norm), len(actual_norm))
-                with open(csv_path, 'w', newline='', encoding='utf-8') as cf:
-                    writer = csv.writer(cf)
-                    # Header
-                    writer.writerow(['whisper_text','actual_text','whisper_start','actual_start','whisper_end','actual_end'])
-                    for i in range(max_len):
-                        w = whisper_norm[i] if i < len(whisper_norm) else {'word':'','start':'','end':''}
-                        a = actual_norm[i] if i < len(actual_norm) else {'text':'','start':'','end':''}
-                        writer.writerow([w.get('word',''), a.get('text',''), w.get('start',''), a.get('start',''), w.get('end',''), a.get('end','')])
-            except Exception:
-                logging.exception(f"Failed to write normalized transcript CSV for {file_stem}")
-
-            # Calculate Word Error Rate using normalized lists
-            wer_metrics = calculate_word_error_rate(whisper_norm, actual_norm)
-
-            # Calculate timing RMSE (only for correctly matched words)
-            timing_metrics = calculate_timing_rmse(whisper_norm, actual_norm)
-
-            result = {
-                'file': file_stem,
-                'demucs_time': demucs_time,
-                'whisper_time': whisper_time,
-                **wer_metrics,
-                **timing_metrics,
-            }
-            
-            results.append(result)
-            
-            logging.info(f"✓ WER: {wer_metrics['wer']:.3f} | Correct: {wer_metrics['correct_matches']}/{wer_metrics['total_actual_words']}")
-            logging.info(f"✓ Start RMSE: {timing_metrics['start_rmse']:.6f}s | End RMSE: {timing_metrics['end_rmse']:.6f}s")
-            logging.info(f"✓ Matched words with timing: {timing_metrics['matched_words_with_timing']}")
-            
-        except Exception as e:
-            logging.error(f"Unexpected error processing {file_stem}: {e}", exc_info=True)
-            continue
-    
+                return None
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(cached_transcription, 'w', encoding='utf-8') as f:
+                json.dump(transcription, f)
+        whisper_end = time.perf_counter()
+        whisper_time = whisper_end - whisper_start
+
+        whisper_words = transcription.get('words', [])
+
+        if not whisper_words:
+            logging.warning(f"No words extracted from transcription for {file_stem}")
+            return None
+
+        # Normalize both whisper and actual words ONCE here
+        # normalized transcripts are NormalizedWords (texts + timing arrays)
+        whisper_norm = normalize_transcript_words(whisper_words, key='word')
+        actual_norm = normalize_transcript_words(actual_words, key='text')
+
+        # Save normalized transcripts to CSV for inspection / reuse
+        norm_dir = project_root / "data/eval/normalized_transcripts"
+        norm_dir.mkdir(parents=True, exist_ok=True)
+        csv_path = norm_dir / f"{file_stem}.csv"
+        try:
+            # Build columns aligning by index; if lengths differ, fill blanks
+            max_len = max(len(whisper_norm), len(actual_norm))
+
+            def pad(column):
+                return list(column) + [''] * (max_len - len(column))
+
+            norm_df = pd.DataFrame({
+                'whisper_text': pad(whisper_norm.texts),
+                'actual_text': pad(actual_norm.texts),
+                'whisper_start': pad(whisper_norm.starts),
+                'actual_start': pad(actual_norm.starts),
+                'whisper_end': pad(whisper_norm.ends),
+                'actual_end': pad(actual_norm.ends),
+            })
+            norm_df.to_csv(csv_path, index=False)
+        except Exception:
+            logging.exception(f"Failed to write normalized transcript CSV for {file_stem}")
+
+        # Align once; WER and timing RMSE share the same opcodes
+        opcodes = align_words(whisper_norm, actual_norm)
+
+        # Calculate Word Error Rate using normalized lists
+        wer_metrics = calculate_word_error_rate(whisper_norm, actual_norm, opcodes=opcodes)
+
+        # Calculate timing RMSE (only for correctly matched words)
+        timing_metrics = calculate_timing_rmse(whisper_norm, actual_norm, opcodes=opcodes)
+
+        result = {
+            'file': file_stem,
+            'demucs_time': demucs_time,
+            'whisper_time': whisper_time,
+            **wer_metrics,
+            **timing_metrics,
+        }
+
+        logging.info(f"✓ WER: {wer_metrics['wer']:.3f} | Correct: {wer_metrics['correct_matches']}/{wer_metrics['total_actual_words']}")
+        logging.info(f"✓ Start RMSE: {timing_metrics['start_rmse']:.6f}s | End RMSE: {timing_metrics['end_rmse']:.6f}s")
+        logging.info(f"✓ Matched words with timing: {timing_metrics['matched_words_with_timing']}")
+
+        return result
+
+    except Exception as e:
+        logging.error(f"Unexpected error processing {file_stem}: {e}", exc_info=True)
+        return None
+
+
+def main():
+    # Load metadata
+    metadata_path = project_root / "data/jamendolyrics/metadata.jsonl"
+    metadata = load_metadata_jsonl(metadata_path)
+
+    # heapq.nsmallest picks the first N files in sorted order in one O(n)
+    # pass without materializing and sorting the whole directory listing
+    audio_files = heapq.nsmallest(1, project_root.glob("data/jamendolyrics/subsets/en/mp3/*.mp3"))
+
+    # Evaluate files in worker processes so one file's CPU-bound metric and
+    # CSV work overlaps with the next file's Demucs/Whisper inference
+    results = []
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(process_one, audio_file, metadata) for audio_file in audio_files]
+        for future in as_completed(futures):
+            result = future.result()
+            if result is not None:
+                results.append(result)
+
+    # Keep the output deterministic regardless of completion order
+    results.sort(key=lambda r: r['file'])
+
     # Create comparison dataframe
     if results:
         df = pd.DataFrame(results)